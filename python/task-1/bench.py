@@ -0,0 +1,130 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from script import (compute_bounds, expand_string, fit_transform, iter_segments,
+                    screen_segments)
+
+# ---------- CATALOG OF CLASSIC SYSTEMS ----------
+# name -> (axiom, rules, angle, max iterations)
+SYSTEMS = {
+    "koch": ("F", {"F": "F+F--F+F"}, 60, 7),
+    "sierpinski": ("F-G-G", {"F": "F-G+F+G-F", "G": "GG"}, 120, 8),
+    "dragon": ("FX", {"X": "X+YF+", "Y": "-FX-Y"}, 90, 16),
+    "plant": ("X", {"X": "F+[[X]-X]-F[-X]+X", "F": "FF"}, 25, 7),
+    "hilbert": ("A", {"A": "+BF-AFA-FB+", "B": "-AF+BFB+FA-"}, 90, 8),
+}
+
+# ---------- UTILS ----------
+def best_time(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def peak_memory(fn):
+    # Run separately from the timing so tracemalloc overhead doesn't skew it
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def count(iterable):
+    n = 0
+    for _ in iterable:
+        n += 1
+    return n
+
+# ---------- BENCHMARKS ----------
+def bench_expand(name, axiom, rules, max_iters, repeat):
+    results = []
+    for iters in range(1, max_iters + 1):
+        seconds, final = best_time(lambda: expand_string(axiom, rules, iters), repeat)
+        peak = peak_memory(lambda: expand_string(axiom, rules, iters))
+        results.append({
+            "system": name,
+            "iterations": iters,
+            "length": len(final),
+            "seconds": seconds,
+            "peak_bytes": peak,
+        })
+    return results
+
+def bench_segments(name, axiom, rules, angle, iters, repeat, width=800, height=800):
+    # Headless version of the drawing path: geometry, bounds, then screen-space LOD
+    commands = expand_string(axiom, rules, iters)
+
+    seg_seconds, segments = best_time(lambda: count(iter_segments(commands, angle)), repeat)
+
+    def draw():
+        bounds = compute_bounds(iter_segments(commands, angle))
+        transform = fit_transform(bounds, width, height)
+        return count(screen_segments(iter_segments(commands, angle), transform, width, height))
+
+    draw_seconds, lines = best_time(draw, repeat)
+    return {
+        "system": name,
+        "iterations": iters,
+        "segments": segments,
+        "segment_seconds": seg_seconds,
+        "segments_per_second": segments / seg_seconds if seg_seconds else None,
+        "lines": lines,
+        "draw_seconds": draw_seconds,
+        "draw_segments_per_second": segments / draw_seconds if draw_seconds else None,
+    }
+
+# ---------- CLI ----------
+def main():
+    parser = argparse.ArgumentParser(description="L-system expansion and rendering benchmarks")
+    parser.add_argument("--systems", nargs="+", choices=sorted(SYSTEMS), default=sorted(SYSTEMS))
+    parser.add_argument("--max-iterations", type=int, default=None,
+                        help="cap iterations for every system (default: per-system limit)")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per measurement (best is kept)")
+    parser.add_argument("-o", "--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "expand": [],
+        "segments": [],
+    }
+
+    for name in args.systems:
+        axiom, rules, angle, max_iters = SYSTEMS[name]
+        if args.max_iterations is not None:
+            max_iters = min(max_iters, args.max_iterations)
+        print(f"{name}: {max_iters} iterations", file=sys.stderr)
+        report["expand"].extend(bench_expand(name, axiom, rules, max_iters, args.repeat))
+        report["segments"].append(bench_segments(name, axiom, rules, angle, max_iters, args.repeat))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,19 @@
-import tkinter as tk
-import turtle
+import argparse
+import json
+import math
+import os
+import queue
+import struct
+import sys
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Tk is optional so the headless renderer works on servers without a display stack
+try:
+    import tkinter as tk
+except ImportError:
+    tk = None
 
 # ---------- THE L-SYSTEM ENGINE ----------
 def expand_string(axiom, rules, iterations):
@@ -12,11 +26,336 @@ def expand_string(axiom, rules, iterations):
         current = next_string
     return current
 
+def parse_rules(text):
+    # "F:F+F-F, X:F[+X]" -> {"F": "F+F-F", "X": "F[+X]"}
+    rules = {}
+    for r in text.split(","):
+        if ":" in r:
+            key, val = r.split(":", 1)
+            rules[key.strip()] = val.strip()
+    return rules
+
+# ---------- HEADLESS GEOMETRY ----------
+# Classic turtle semantics: start at (0, 0) facing up,
+# "+" turns right, "-" turns left, "[" / "]" push and pop the state.
+def iter_segments(commands, angle, step=10):
+    x, y = 0.0, 0.0
+    heading = 90.0
+    stack = []
+    for cmd in commands:
+        if cmd == "F" or cmd == "G":
+            rad = math.radians(heading)
+            nx = x + step * math.cos(rad)
+            ny = y + step * math.sin(rad)
+            yield (x, y, nx, ny)
+            x, y = nx, ny
+        elif cmd == "+":
+            heading -= angle
+        elif cmd == "-":
+            heading += angle
+        elif cmd == "[":
+            stack.append((x, y, heading))
+        elif cmd == "]":
+            if stack:
+                x, y, heading = stack.pop()
+
+def compute_bounds(segments):
+    min_x = min_y = math.inf
+    max_x = max_y = -math.inf
+    for x1, y1, x2, y2 in segments:
+        min_x = min(min_x, x1, x2)
+        max_x = max(max_x, x1, x2)
+        min_y = min(min_y, y1, y2)
+        max_y = max(max_y, y1, y2)
+    if min_x == math.inf:
+        return (0.0, 0.0, 0.0, 0.0)
+    return (min_x, min_y, max_x, max_y)
+
+def fit_transform(bounds, width, height, margin=10):
+    # Scale + offset mapping world coords onto a width x height image (y flipped)
+    min_x, min_y, max_x, max_y = bounds
+    span_x = max(max_x - min_x, 1e-9)
+    span_y = max(max_y - min_y, 1e-9)
+    scale = min((width - 2 * margin) / span_x, (height - 2 * margin) / span_y)
+    off_x = (width - span_x * scale) / 2 - min_x * scale
+    off_y = (height - span_y * scale) / 2 - min_y * scale
+    return scale, off_x, off_y
+
+# ---------- LEVEL OF DETAIL ----------
+LOD_MIN_PIXELS = 2.0  # lines shorter than this on screen are not drawn
+LOD_CELL = 2          # occupancy grid cell size in pixels
+
+class _Occupancy:
+    # Coarse grid of screen cells already covered by an emitted line. A
+    # line is only drawn if it reaches at least one free cell, so the
+    # number of lines is bounded by the cell count, not the string length.
+    def __init__(self, width, height, cell):
+        self.cell = cell
+        self.cols = int(width // cell) + 1
+        self.rows = int(height // cell) + 1
+        self.grid = bytearray(self.cols * self.rows)
+
+    def claim(self, x1, y1, x2, y2):
+        cell = self.cell
+        steps = int(math.hypot(x2 - x1, y2 - y1) / cell) + 1
+        fresh = False
+        for i in range(steps + 1):
+            t = i / steps
+            col = int((x1 + (x2 - x1) * t) // cell)
+            row = int((y1 + (y2 - y1) * t) // cell)
+            if 0 <= col < self.cols and 0 <= row < self.rows:
+                idx = row * self.cols + col
+                if not self.grid[idx]:
+                    self.grid[idx] = 1
+                    fresh = True
+        return fresh
+
+def _flush_line(run, width, height, min_len, occupied):
+    x1, y1, x2, y2 = run
+    if math.hypot(x2 - x1, y2 - y1) < min_len:
+        return None
+    # Viewport culling: drop lines entirely off one side of the screen
+    if max(x1, x2) < 0 or min(x1, x2) > width or max(y1, y2) < 0 or min(y1, y2) > height:
+        return None
+    if occupied is not None and not occupied.claim(x1, y1, x2, y2):
+        return None
+    return run
+
+def screen_segments(segments, transform, width, height, min_len=LOD_MIN_PIXELS, occupancy=True):
+    # Maps world segments to screen space, merging straight runs and
+    # sub-pixel detail into single lines before culling them. The
+    # occupancy grid is for the Tk canvas item count; exporters turn it off.
+    scale, off_x, off_y = transform
+    occupied = _Occupancy(width, height, LOD_CELL) if occupancy else None
+    run = None  # [x1, y1, x2, y2] of the line being built
+    for wx1, wy1, wx2, wy2 in segments:
+        x1 = wx1 * scale + off_x
+        y1 = height - (wy1 * scale + off_y)
+        x2 = wx2 * scale + off_x
+        y2 = height - (wy2 * scale + off_y)
+
+        if run is not None and abs(run[2] - x1) < 1e-6 and abs(run[3] - y1) < 1e-6:
+            # Contiguous: extend if it keeps going straight, or if the
+            # run so far is still too short to be drawn on its own
+            dx1, dy1 = run[2] - run[0], run[3] - run[1]
+            dx2, dy2 = x2 - x1, y2 - y1
+            cross = dx1 * dy2 - dy1 * dx2
+            straight = abs(cross) <= 1e-6 * math.hypot(dx1, dy1) * math.hypot(dx2, dy2) \
+                and dx1 * dx2 + dy1 * dy2 > 0
+            if straight or math.hypot(dx1, dy1) < min_len:
+                run[2], run[3] = x2, y2
+                continue
+
+        if run is not None:
+            line = _flush_line(run, width, height, min_len, occupied)
+            if line:
+                yield tuple(line)
+        run = [x1, y1, x2, y2]
+
+    if run is not None:
+        line = _flush_line(run, width, height, min_len, occupied)
+        if line:
+            yield tuple(line)
+
+# ---------- SVG / PNG EXPORT ----------
+SVG_CHUNK = 4096  # path commands buffered before each write
+
+def write_svg(path, commands, angle, width=800, height=800, stroke="#000000"):
+    bounds = compute_bounds(iter_segments(commands, angle))
+    transform = fit_transform(bounds, width, height)
+
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'viewBox="0 0 {width} {height}">\n'
+            f'<rect width="100%" height="100%" fill="white"/>\n'
+            f'<path fill="none" stroke="{stroke}" stroke-width="1" d="'
+        )
+        # Second pass over the geometry: stream the path out in chunks
+        # instead of holding the whole document in memory
+        parts = []
+        last = None
+        # Vector output keeps every line; only straight runs are merged
+        lines = screen_segments(iter_segments(commands, angle), transform, width, height,
+                                min_len=0, occupancy=False)
+        for x1, y1, x2, y2 in lines:
+            if last != (x1, y1):
+                parts.append(f"M{x1:.2f} {y1:.2f}")
+            parts.append(f"L{x2:.2f} {y2:.2f}")
+            last = (x2, y2)
+            count += 1
+            if len(parts) >= SVG_CHUNK:
+                f.write(" ".join(parts))
+                f.write(" ")
+                parts.clear()
+        f.write(" ".join(parts))
+        f.write('"/>\n</svg>\n')
+    return count
+
+def _png_chunk(kind, data):
+    chunk = kind + data
+    return struct.pack(">I", len(data)) + chunk + struct.pack(">I", zlib.crc32(chunk) & 0xFFFFFFFF)
+
+def write_png(path, commands, angle, width=800, height=800):
+    bounds = compute_bounds(iter_segments(commands, angle))
+    transform = fit_transform(bounds, width, height)
+
+    # 8-bit grayscale raster, white background, black lines (Bresenham)
+    pixels = bytearray(b"\xff" * (width * height))
+    count = 0
+    # Like the SVG: straight runs are merged, nothing is dropped or culled
+    lines = screen_segments(iter_segments(commands, angle), transform, width, height,
+                            min_len=0, occupancy=False)
+    for x1, y1, x2, y2 in lines:
+        px, py = int(round(x1)), int(round(y1))
+        qx, qy = int(round(x2)), int(round(y2))
+        dx = abs(qx - px)
+        dy = -abs(qy - py)
+        step_x = 1 if px < qx else -1
+        step_y = 1 if py < qy else -1
+        err = dx + dy
+        while True:
+            if 0 <= px < width and 0 <= py < height:
+                pixels[py * width + px] = 0
+            if px == qx and py == qy:
+                break
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                px += step_x
+            if e2 <= dx:
+                err += dx
+                py += step_y
+        count += 1
+
+    raw = bytearray()
+    for row in range(height):
+        raw.append(0)  # filter type: none
+        raw += pixels[row * width:(row + 1) * width]
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)))
+        f.write(_png_chunk(b"IDAT", zlib.compress(bytes(raw), 6)))
+        f.write(_png_chunk(b"IEND", b""))
+    return count
+
+def render_spec(spec):
+    # spec: {"axiom", "rules", "angle", "iterations", "output", optional "width"/"height"}
+    rules = spec["rules"]
+    if isinstance(rules, str):
+        rules = parse_rules(rules)
+    commands = expand_string(spec["axiom"], rules, int(spec["iterations"]))
+    angle = float(spec["angle"])
+    output = spec["output"]
+    width = int(spec.get("width", 800))
+    height = int(spec.get("height", 800))
+
+    ext = os.path.splitext(output)[1].lower()
+    if ext == ".svg":
+        count = write_svg(output, commands, angle, width, height)
+    elif ext == ".png":
+        count = write_png(output, commands, angle, width, height)
+    else:
+        raise ValueError(f"Unsupported output format: {output} (use .svg or .png)")
+    return output, count
+
+def load_specs(path):
+    # One JSON object per line; blank lines and "#" comments are skipped
+    specs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                specs.append(json.loads(line))
+    return specs
+
+# ---------- BACKGROUND RENDER JOB ----------
+SEGMENT_BATCH = 2000  # screen lines handed to the UI (and drawn) per tick
+POLL_MS = 15          # delay between UI ticks
+QUEUE_DEPTH = 8       # messages the worker may run ahead of the UI
+
+class RenderJob:
+    # Expands the string and computes geometry on a worker thread.
+    # Results go to the UI through a queue as ("kind", payload) messages.
+    def __init__(self, axiom, rules, angle, iterations, width, height):
+        self.axiom = axiom
+        self.rules = rules
+        self.angle = angle
+        self.iterations = iterations
+        self.width = width
+        self.height = height
+        self.queue = queue.Queue(maxsize=QUEUE_DEPTH)
+        self.cancelled = threading.Event()
+        self.consumed = 0  # world segments read by the current geometry pass
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def put(self, message):
+        # Waits for the UI to catch up, but gives up once cancelled
+        while not self.cancelled.is_set():
+            try:
+                self.queue.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def checked(self, segments):
+        # Stops a long geometry pass as soon as the job is cancelled
+        self.consumed = 0
+        for i, seg in enumerate(segments):
+            if i % SEGMENT_BATCH == 0 and self.cancelled.is_set():
+                return
+            self.consumed = i + 1
+            yield seg
+
+    def run(self):
+        try:
+            # Expand one generation at a time so cancel is checked in between
+            current = self.axiom
+            for i in range(self.iterations):
+                if self.cancelled.is_set():
+                    return
+                current = expand_string(current, self.rules, 1)
+                if not self.put(("expanded", (i + 1, len(current)))):
+                    return
+
+            if not self.put(("total", current.count("F") + current.count("G"))):
+                return
+
+            # Pass 1: bounding box for auto-fit; pass 2: screen-space lines
+            bounds = compute_bounds(self.checked(iter_segments(current, self.angle)))
+            transform = fit_transform(bounds, self.width, self.height)
+            lines = screen_segments(self.checked(iter_segments(current, self.angle)),
+                                    transform, self.width, self.height)
+
+            batch = []
+            for seg in lines:
+                batch.append(seg)
+                if len(batch) >= SEGMENT_BATCH:
+                    if not self.put(("segments", (batch, self.consumed))):
+                        return
+                    batch = []
+            if self.put(("segments", (batch, self.consumed))):
+                self.put(("done", None))
+        except Exception as e:
+            self.put(("error", str(e)))
+
 # ---------- THE MAIN APP CLASS ----------
 class LSystemApp:
     def __init__(self, root):
         self.root = root
         self.root.title("L-System Fractal Architect")
+        self.job = None
+        self.drawn = 0
+        self.total = None
 
         # 1. Dashboard (Sidebar)
         self.sidebar = tk.Frame(root, padx=10, pady=10, bg="#f0f0f0")
@@ -24,87 +363,199 @@ class LSystemApp:
 
         # UI Elements
         tk.Label(self.sidebar, text="Axiom:", bg="#f0f0f0").pack(anchor="w")
-        self.entry_axiom = tk.Entry(self.sidebar)
-        self.entry_axiom.insert(0, "F")
+        self.var_axiom = tk.StringVar(value="F")
+        self.entry_axiom = tk.Entry(self.sidebar, textvariable=self.var_axiom)
         self.entry_axiom.pack(fill="x", pady=5)
 
         tk.Label(self.sidebar, text="Rules (e.g., F:F+F-F):", bg="#f0f0f0").pack(anchor="w")
-        self.entry_rules = tk.Entry(self.sidebar)
-        self.entry_rules.insert(0, "F:F[+F]-F")
+        self.var_rules = tk.StringVar(value="F:F[+F]-F")
+        self.entry_rules = tk.Entry(self.sidebar, textvariable=self.var_rules)
         self.entry_rules.pack(fill="x", pady=5)
 
         tk.Label(self.sidebar, text="Angle (degrees):", bg="#f0f0f0").pack(anchor="w")
-        self.entry_angle = tk.Entry(self.sidebar)
-        self.entry_angle.insert(0, "30")
+        self.var_angle = tk.StringVar(value="30")
+        self.entry_angle = tk.Entry(self.sidebar, textvariable=self.var_angle)
         self.entry_angle.pack(fill="x", pady=5)
 
         tk.Label(self.sidebar, text="Iterations:", bg="#f0f0f0").pack(anchor="w")
-        self.entry_iterations = tk.Entry(self.sidebar)
-        self.entry_iterations.insert(0, "4")
+        self.var_iterations = tk.StringVar(value="4")
+        self.entry_iterations = tk.Entry(self.sidebar, textvariable=self.var_iterations)
         self.entry_iterations.pack(fill="x", pady=5)
 
+        # Any change to an input (typing, pasting, deleting) abandons the drawing in progress
+        for var in (self.var_axiom, self.var_rules, self.var_angle, self.var_iterations):
+            var.trace_add("write", lambda *args: self.cancel())
+
         self.btn_generate = tk.Button(self.sidebar, text="Generate Fractal", 
                                       command=self.execute, bg="#4CAF50", fg="white")
-        self.btn_generate.pack(fill="x", pady=20)
+        self.btn_generate.pack(fill="x", pady=(20, 5))
+
+        self.btn_cancel = tk.Button(self.sidebar, text="Cancel", command=self.cancel,
+                                    state=tk.DISABLED)
+        self.btn_cancel.pack(fill="x", pady=5)
 
-        # 2. Canvas & Turtle Setup
+        self.status = tk.Label(self.sidebar, text="Idle", bg="#f0f0f0",
+                               justify=tk.LEFT, wraplength=160)
+        self.status.pack(anchor="w", pady=10)
+
+        # 2. Canvas Setup (lines are drawn straight onto the canvas in batches)
         self.canvas = tk.Canvas(root, width=800, height=800, bg="white")
         self.canvas.pack(side=tk.LEFT, expand=True, fill="both")
 
-        # Use RawTurtle to draw inside the Tkinter Canvas
-        self.t = turtle.RawTurtle(self.canvas)
-        self.t.hideturtle()
-        
     def execute(self):
         # --- 1. Get Inputs ---
-        axiom = self.entry_axiom.get().strip()
-        angle = float(self.entry_angle.get())
-        iters = int(self.entry_iterations.get())
-        
+        try:
+            axiom = self.entry_axiom.get().strip()
+            angle = float(self.entry_angle.get())
+            iters = int(self.entry_iterations.get())
+        except ValueError:
+            self.status.config(text="Angle and iterations must be numbers")
+            return
+
         # Parse Rules Safely (fixing the "unpack" error)
-        rules_text = self.entry_rules.get().split(",")
-        rules_dict = {}
-        for r in rules_text:
-            if ":" in r:
-                key, val = r.split(":")
-                rules_dict[key.strip()] = val.strip()
-
-        # --- 2. Expand String ---
-        final_string = expand_string(axiom, rules_dict, iters)
-
-        # --- 3. Draw with Optimization ---
-        self.t.screen.tracer(0, 0) # Turn off animation (Speed Optimization)
-        self.t.clear()
-        self.t.penup()
-        self.t.home()              # Go to (0,0) center
-        self.t.setheading(90)      # Point up
-        self.t.pendown()
-
-        stack = [] # The "Memory" for branching [ ]
-
-        for cmd in final_string:
-            if cmd == "F" or cmd == "G":
-                self.t.forward(10)
-            elif cmd == "+":
-                self.t.right(angle)
-            elif cmd == "-":
-                self.t.left(angle)
-            elif cmd == "[":
-                # Save spot: position and angle
-                stack.append((self.t.position(), self.t.heading()))
-            elif cmd == "]":
-                # Return to spot
-                if stack:
-                    pos, head = stack.pop()
-                    self.t.penup()
-                    self.t.goto(pos)
-                    self.t.setheading(head)
-                    self.t.pendown()
-
-        self.t.screen.update() # Refresh screen to show drawing
+        rules_dict = parse_rules(self.entry_rules.get())
+
+        # --- 2. Start the background job ---
+        self.cancel()
+        self.canvas.delete("all")
+        self.drawn = 0
+        self.total = None
+        width = max(self.canvas.winfo_width(), 1)
+        height = max(self.canvas.winfo_height(), 1)
+        self.job = RenderJob(axiom, rules_dict, angle, iters, width, height)
+        self.job.start()
+        self.btn_cancel.config(state=tk.NORMAL)
+        self.status.config(text="Expanding...")
+        self.root.after(POLL_MS, self.poll, self.job)
+
+    def cancel(self):
+        if self.job is None:
+            return
+        self.job.cancel()
+        self.job = None
+        self.btn_cancel.config(state=tk.DISABLED)
+        self.status.config(text=f"Cancelled ({self.drawn} canvas items drawn)")
+
+    def poll(self, job):
+        # --- 3. Draw progressively, one batch per tick ---
+        if job is not self.job:
+            return  # stale job: it was cancelled or replaced
+
+        while True:
+            try:
+                kind, payload = job.queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if kind == "expanded":
+                gen, length = payload
+                self.status.config(text=f"Expanding: generation {gen}/{job.iterations}\n{length} symbols")
+            elif kind == "total":
+                self.total = payload
+            elif kind == "segments":
+                lines, consumed = payload
+                self.draw_batch(lines)
+                self.status.config(text=f"Drawing: {consumed}/{self.total} segments\n"
+                                        f"{self.drawn} canvas items")
+                break  # give Tk a chance to repaint before the next batch
+            elif kind == "done":
+                self.job = None
+                self.btn_cancel.config(state=tk.DISABLED)
+                self.status.config(text=f"Done: {self.total} segments\n"
+                                        f"{self.drawn} canvas items")
+                return
+            elif kind == "error":
+                self.job = None
+                self.btn_cancel.config(state=tk.DISABLED)
+                self.status.config(text=f"Error: {payload}")
+                return
+
+        self.root.after(POLL_MS, self.poll, job)
+
+    def draw_batch(self, lines):
+        # Lines arrive already fitted to the canvas in screen coordinates
+        for x1, y1, x2, y2 in lines:
+            self.canvas.create_line(x1, y1, x2, y2)
+        self.drawn += len(lines)
+
+# ---------- CLI ----------
+def run_headless(args):
+    # Returns the number of specs that failed to render
+    if args.batch:
+        specs = load_specs(args.batch)
+        for spec in specs:
+            # CLI size is the default for specs that don't set their own
+            spec.setdefault("width", args.width)
+            spec.setdefault("height", args.height)
+    else:
+        specs = [{
+            "axiom": args.axiom,
+            "rules": args.rules,
+            "angle": args.angle,
+            "iterations": args.iterations,
+            "output": args.output,
+            "width": args.width,
+            "height": args.height,
+        }]
+
+    failures = 0
+    if len(specs) == 1 or args.jobs == 1:
+        for spec in specs:
+            try:
+                output, count = render_spec(spec)
+                print(f"{output}: {count} segments")
+            except Exception as e:
+                print(f"{spec.get('output')}: failed ({e})", file=sys.stderr)
+                failures += 1
+        return failures
+
+    # Each spec is independent, so fan them out across processes
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(render_spec, spec): spec for spec in specs}
+        for future in as_completed(futures):
+            try:
+                output, count = future.result()
+                print(f"{output}: {count} segments")
+            except Exception as e:
+                print(f"{futures[future].get('output')}: failed ({e})", file=sys.stderr)
+                failures += 1
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="L-System Fractal Architect")
+    parser.add_argument("--axiom", default="F")
+    parser.add_argument("--rules", default="F:F[+F]-F")
+    parser.add_argument("--angle", type=float, default=30)
+    parser.add_argument("--iterations", type=int, default=4)
+    parser.add_argument("-o", "--output", help="render headless to this .svg or .png file")
+    parser.add_argument("--batch", help="file of JSON specs (one per line) to render headless")
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=800)
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes for --batch")
+    args = parser.parse_args()
+
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    if args.output or args.batch:
+        try:
+            failures = run_headless(args)
+        except (OSError, ValueError) as e:
+            # unreadable or malformed --batch file
+            print(f"{args.batch}: {e}", file=sys.stderr)
+            sys.exit(1)
+        if failures:
+            print(f"{failures} spec(s) failed", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    if tk is None:
+        parser.error("Tk is not available; use --output or --batch to render headless")
 
-# ---------- RUN THE PROGRAM ----------
-if __name__ == "__main__":
     root = tk.Tk()
     app = LSystemApp(root)
     root.mainloop()
+
+# ---------- RUN THE PROGRAM ----------
+if __name__ == "__main__":
+    main()
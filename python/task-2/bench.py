@@ -0,0 +1,160 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from script import LineFramer, decode_line, parse_message
+
+CHUNK = 4096  # same read size as IRCClient.listen
+
+# ---------- TRAFFIC ----------
+def synthetic_traffic(lines, seed=0):
+    # Busy-channel mix: chat (some with IRCv3 tags and non-ASCII text),
+    # joins/parts, numerics and pings
+    rng = random.Random(seed)
+    nicks = [f"user{i}" for i in range(200)]
+    words = ["hello", "build", "passed", "café", "naïve", "日本語", "ok", "lgtm", "ping", "🚀"]
+    out = []
+    for i in range(lines):
+        nick = rng.choice(nicks)
+        prefix = f":{nick}!~{nick}@host-{rng.randrange(1000)}.example.net"
+        kind = rng.random()
+        if kind < 0.70:
+            text = " ".join(rng.choice(words) for _ in range(rng.randint(3, 25)))
+            tags = ""
+            if rng.random() < 0.5:
+                tags = f"@time=2024-01-01T00:00:{i % 60:02d}.000Z;msgid=abc{i};account={nick} "
+            out.append(f"{tags}{prefix} PRIVMSG #busy :{text}")
+        elif kind < 0.80:
+            out.append(f"{prefix} JOIN #busy")
+        elif kind < 0.88:
+            out.append(f"{prefix} PART #busy :Leaving")
+        elif kind < 0.97:
+            out.append(f":irc.example.net 353 me = #busy :{' '.join(rng.sample(nicks, 20))}")
+        else:
+            out.append("PING :irc.example.net")
+    return ("\r\n".join(out) + "\r\n").encode("utf-8")
+
+def chunks(data, size=CHUNK):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+# ---------- PARSERS UNDER TEST ----------
+def legacy(pieces):
+    # The original listen/handle_line: str buffer re-split per line, then
+    # the same field extraction handle_line did (prefix, nick, channel,
+    # message). It ignores tags, so it still does less work than parse_message.
+    count = 0
+    buffer = ""
+    for piece in pieces:
+        buffer += piece.decode(errors="ignore")
+        while "\r\n" in buffer:
+            line, buffer = buffer.split("\r\n", 1)
+            if line.startswith("PING"):
+                token = line.split()[1]
+                count += 1
+                continue
+            parts = line.split()
+            if len(parts) < 2:
+                continue
+            prefix = parts[0]
+            cmd = parts[1]
+            if cmd == "PRIVMSG":
+                nick = prefix.split("!")[0][1:]
+                channel = parts[2]
+                message = " ".join(parts[3:])[1:]
+            elif cmd == "JOIN":
+                nick = prefix.split("!")[0][1:]
+                channel = parts[2] if len(parts) > 2 else None
+            count += 1
+    return count
+
+def framed(pieces):
+    count = 0
+    framer = LineFramer()
+    for piece in pieces:
+        for raw in framer.feed(piece):
+            if parse_message(decode_line(raw)) is not None:
+                count += 1
+    return count
+
+def frame_only(pieces):
+    count = 0
+    framer = LineFramer()
+    for piece in pieces:
+        count += len(framer.feed(piece))
+    return count
+
+# ---------- UTILS ----------
+def best_time(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# ---------- CLI ----------
+def main():
+    parser = argparse.ArgumentParser(description="IRC framing and parsing throughput")
+    parser.add_argument("--traffic", help="raw recorded server traffic (bytes as received); synthetic if omitted")
+    parser.add_argument("--lines", type=int, default=200000, help="synthetic traffic size")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per measurement (best is kept)")
+    parser.add_argument("-o", "--output", help="write JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.traffic:
+        with open(args.traffic, "rb") as f:
+            data = f.read()
+    else:
+        data = synthetic_traffic(args.lines)
+    pieces = chunks(data)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "traffic": args.traffic or f"synthetic:{args.lines}",
+        "bytes": len(data),
+        "repeat": args.repeat,
+        "results": [],
+    }
+
+    cases = (
+        ("legacy", legacy, "old str buffer + handle_line field extraction (no tags)"),
+        ("frame_only", frame_only, "LineFramer only, no decode or parse"),
+        ("frame_and_parse", framed, "LineFramer + decode + full parse_message (tags, prefix, params)"),
+    )
+    for name, fn, work in cases:
+        print(f"{name}...", file=sys.stderr)
+        seconds, lines = best_time(lambda: fn(pieces), args.repeat)
+        report["results"].append({
+            "name": name,
+            "work": work,
+            "lines": lines,
+            "seconds": seconds,
+            "lines_per_second": lines / seconds if seconds else None,
+            "mb_per_second": len(data) / seconds / 1e6 if seconds else None,
+        })
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,18 @@ import socket
 import sys
 import threading
 import argparse
+import asyncio
+import heapq
+import json
+import math
+import mmap
+import os
+import queue
+import ssl
+import struct
+import time
 from datetime import datetime
+from urllib.parse import quote
 
 # --------- ANSI COLORS ----------
 RESET = "\033[0m"
@@ -19,19 +30,538 @@ def ts():
 def log(msg, color=GRAY):
     print(f"{color}[{ts()}] {msg}{RESET}")
 
+# --------- PROTOCOL ----------
+MAX_LINE = 8191 + 512  # IRCv3 tag budget + classic 512-byte message
+
+class LineFramer:
+    # Splits a byte stream into lines without re-copying the backlog:
+    # bytes are appended once, complete lines are sliced out through a
+    # memoryview and the consumed prefix is dropped in a single del.
+    # Framing on bytes means a UTF-8 character split across two reads is
+    # only decoded once its whole line has arrived.
+    __slots__ = ("buffer", "scan", "discarding")
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.scan = 0  # bytes already searched for a line ending
+        self.discarding = False  # inside an oversized line: skip to the next "\n"
+
+    def feed(self, data):
+        if self.discarding:
+            end = data.find(b"\n")
+            if end < 0:
+                return []
+            data = data[end + 1:]
+            self.discarding = False
+
+        buf = self.buffer
+        buf += data
+        lines = []
+        start = 0
+        pos = self.scan
+        with memoryview(buf) as view:
+            while True:
+                end = buf.find(b"\n", pos)
+                if end < 0:
+                    break
+                stop = end - 1 if end > start and buf[end - 1] == 0x0D else end
+                # Lines that grew past the limit across reads are dropped too
+                if start < stop and stop - start <= MAX_LINE:
+                    lines.append(bytes(view[start:stop]))
+                start = pos = end + 1
+        if start:
+            del buf[:start]
+        if len(buf) > MAX_LINE:
+            # No line ending within the protocol limit: drop what we have
+            # and the rest of the line, so its tail is never parsed
+            buf.clear()
+            self.discarding = True
+        self.scan = len(buf)
+        return lines
+
+TAG_ESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
+def unescape_tag(value):
+    if "\\" not in value:
+        return value
+    out = []
+    i = 0
+    while i < len(value):
+        ch = value[i]
+        if ch == "\\" and i + 1 < len(value):
+            nxt = value[i + 1]
+            out.append(TAG_ESCAPES.get(nxt, nxt))
+            i += 2
+        elif ch == "\\":
+            i += 1  # trailing lone backslash is dropped
+        else:
+            out.append(ch)
+            i += 1
+    return "".join(out)
+
+class IRCMessage:
+    __slots__ = ("tags", "prefix", "command", "params")
+
+    def __init__(self, tags, prefix, command, params):
+        self.tags = tags
+        self.prefix = prefix
+        self.command = command
+        self.params = params
+
+    @property
+    def nick(self):
+        return self.prefix.split("!", 1)[0]
+
+    def __repr__(self):
+        return f"IRCMessage({self.tags!r}, {self.prefix!r}, {self.command!r}, {self.params!r})"
+
+def parse_message(line):
+    # One left-to-right pass: [@tags] [:prefix] COMMAND [params] [:trailing]
+    tags = {}
+    if line.startswith("@"):
+        tag_text, _, line = line[1:].partition(" ")
+        for item in tag_text.split(";"):
+            if item:
+                key, _, value = item.partition("=")
+                tags[key] = unescape_tag(value)
+        line = line.lstrip(" ")
+
+    prefix = ""
+    if line.startswith(":"):
+        prefix, _, line = line[1:].partition(" ")
+        line = line.lstrip(" ")
+
+    head, sep, trailing = line.partition(" :")
+    params = head.split(" ")
+    if "" in params:
+        params = [p for p in params if p]
+    if not params:
+        return None
+    command = params[0].upper()
+    del params[0]
+    if sep:
+        params.append(trailing)
+    return IRCMessage(tags, prefix, command, params)
+
+def decode_line(raw):
+    return raw.decode("utf-8", errors="replace")
+
+# --------- OUTBOUND QUEUE ----------
+PRIORITY_URGENT = 0  # PONG/QUIT/registration: never waits behind the backlog or the flood limit
+PRIORITY_NORMAL = 1  # everything else, sent strictly in FIFO order
+
+URGENT_COMMANDS = {"PONG", "PING", "QUIT", "NICK", "USER", "PASS", "CAP"}
+
+FLOOD_BURST = 5       # lines the server lets through at once
+FLOOD_INTERVAL = 2.0  # seconds per line after the burst
+MAX_WRITE = 4096      # bytes coalesced into one sendall
+
+def command_priority(cmd):
+    name = cmd.split(" ", 1)[0].upper()
+    if name in URGENT_COMMANDS:
+        return PRIORITY_URGENT
+    return PRIORITY_NORMAL
+
+class PacedOutbox:
+    # Ordering and flood-control bookkeeping shared by the threaded and
+    # asyncio writers (no I/O, no locking). Urgent lines jump the queue;
+    # everything else stays FIFO. Every line takes a token from the
+    # bucket; urgent ones may drive it negative so later lines wait.
+    def __init__(self, burst=FLOOD_BURST, interval=FLOOD_INTERVAL):
+        self.burst = burst
+        self.interval = interval
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.heap = []
+        self.seq = 0
+
+        # stats
+        self.lines_sent = 0
+        self.bytes_sent = 0
+        self.writes = 0
+        self.max_depth = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, line, priority=PRIORITY_NORMAL):
+        heapq.heappush(self.heap, (priority, self.seq, time.monotonic(), (line + "\r\n").encode()))
+        self.seq += 1
+        self.max_depth = max(self.max_depth, len(self.heap))
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) / self.interval)
+        self.refilled_at = now
+
+    def wait_time(self, paced=True):
+        # Seconds until take() can return something (None: queue empty)
+        if not self.heap:
+            return None
+        self._refill()
+        if not paced or self.heap[0][0] == PRIORITY_URGENT or self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * self.interval
+
+    def take(self, paced=True):
+        # Pops the lines allowed out now, up to MAX_WRITE bytes
+        self._refill()
+        batch = []
+        size = 0
+        now = time.monotonic()
+        while self.heap and size < MAX_WRITE:
+            priority, _, queued_at, data = self.heap[0]
+            if paced and priority != PRIORITY_URGENT and self.tokens < 1:
+                break
+            self.tokens -= 1
+            heapq.heappop(self.heap)
+            batch.append(data)
+            size += len(data)
+            latency = now - queued_at
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+        return batch
+
+    def sent(self, batch):
+        self.writes += 1
+        self.lines_sent += len(batch)
+        self.bytes_sent += sum(len(data) for data in batch)
+
+    def clear(self):
+        dropped = len(self.heap)
+        self.heap.clear()
+        return dropped
+
+    def stats(self):
+        return {
+            "depth": len(self.heap),
+            "max_depth": self.max_depth,
+            "lines_sent": self.lines_sent,
+            "bytes_sent": self.bytes_sent,
+            "writes": self.writes,
+            "lines_per_write": self.lines_sent / self.writes if self.writes else 0.0,
+            "avg_latency_ms": 1000 * self.latency_total / self.lines_sent if self.lines_sent else 0.0,
+            "max_latency_ms": 1000 * self.latency_max,
+        }
+
+class SendQueue:
+    # Single writer thread draining a PacedOutbox; whatever is allowed
+    # out at once is joined into one write.
+    def __init__(self, send, burst=FLOOD_BURST, interval=FLOOD_INTERVAL):
+        self.send = send
+        self.outbox = PacedOutbox(burst, interval)
+        self.cond = threading.Condition()
+        self.closed = False
+        self.failed = False   # a write failed: the connection is gone
+        self.deadline = None  # set by close(): flush until then
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def put(self, line, priority=PRIORITY_NORMAL):
+        with self.cond:
+            if self.failed:
+                log(f"Not connected, dropped: {line}", RED)
+                return
+            if self.closed:
+                return
+            self.outbox.push(line, priority)
+            self.cond.notify()
+
+    def close(self, timeout=2.0):
+        # Stop accepting lines and flush the backlog, ignoring the flood
+        # limit, for up to `timeout` seconds
+        with self.cond:
+            self.closed = True
+            self.deadline = time.monotonic() + timeout
+            self.cond.notify()
+        if self.thread.is_alive():
+            self.thread.join(timeout + 0.5)
+
+    def run(self):
+        while True:
+            with self.cond:
+                while True:
+                    if self.closed and time.monotonic() >= self.deadline:
+                        dropped = self.outbox.clear()
+                        if dropped:
+                            log(f"Dropped {dropped} unsent line(s) on close", RED)
+                        return
+                    wait = self.outbox.wait_time(paced=not self.closed)
+                    if wait is None:
+                        if self.closed:
+                            return
+                        self.cond.wait()
+                    elif wait > 0:
+                        self.cond.wait(wait)
+                    else:
+                        break
+                batch = self.outbox.take(paced=not self.closed)
+
+            try:
+                self.send(b"".join(batch))
+            except OSError as e:
+                with self.cond:
+                    dropped = self.outbox.clear()
+                    if not self.closed:
+                        log(f"Send error: {e}", RED)
+                    if dropped:
+                        log(f"Dropped {dropped} unsent line(s)", RED)
+                    self.failed = True
+                    self.closed = True
+                return
+
+            with self.cond:
+                self.outbox.sent(batch)
+
+    def stats(self):
+        with self.cond:
+            return self.outbox.stats()
+
+class AsyncSendQueue:
+    # asyncio counterpart of SendQueue: one writer task per connection,
+    # awaiting drain() so a slow peer pushes back instead of growing the
+    # transport buffer without bound
+    def __init__(self, burst=FLOOD_BURST, interval=FLOOD_INTERVAL, name=""):
+        self.outbox = PacedOutbox(burst, interval)
+        self.name = name
+        self.wakeup = asyncio.Event()
+        self.writer = None
+        self.task = None
+        self.closed = False
+        self.deadline = None
+
+    def start(self, writer):
+        self.writer = writer
+        self.task = asyncio.ensure_future(self.run())
+
+    def put(self, line, priority=PRIORITY_NORMAL):
+        # Lines queued before start() wait for the connection
+        if self.closed:
+            return
+        self.outbox.push(line, priority)
+        self.wakeup.set()
+
+    async def close(self, timeout=2.0):
+        # Flush the backlog, ignoring the flood limit, for up to `timeout` seconds
+        self.closed = True
+        self.deadline = time.monotonic() + timeout
+        self.wakeup.set()
+        if self.task is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(self.task), timeout + 0.5)
+            except asyncio.TimeoutError:
+                self.task.cancel()
+
+    def cancel(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+    async def run(self):
+        try:
+            while True:
+                if self.closed and time.monotonic() >= self.deadline:
+                    dropped = self.outbox.clear()
+                    if dropped:
+                        log(f"[{self.name}] Dropped {dropped} unsent line(s) on close", RED)
+                    return
+                wait = self.outbox.wait_time(paced=not self.closed)
+                if wait is None and self.closed:
+                    return
+                if wait is None or wait > 0:
+                    if self.closed:
+                        wait = max(0.0, self.deadline - time.monotonic())
+                    self.wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                batch = self.outbox.take(paced=not self.closed)
+                self.writer.write(b"".join(batch))
+                await self.writer.drain()
+                self.outbox.sent(batch)
+        except (OSError, ConnectionError) as e:
+            dropped = self.outbox.clear()
+            if not self.closed:
+                log(f"[{self.name}] Send error: {e}", RED)
+            if dropped:
+                log(f"[{self.name}] Dropped {dropped} unsent line(s)", RED)
+            self.closed = True
+
+    def stats(self):
+        return self.outbox.stats()
+
+# --------- CHAT LOG ----------
+# One append-only segment per channel (<channel>.log) holding
+# "epoch_ms<TAB>nick<TAB>kind<TAB>text" lines, plus a sparse time index
+# (<channel>.idx) of fixed 16-byte (first_ms, offset) records, one per
+# flushed batch. Appends only touch an in-memory queue; a writer thread
+# does the disk I/O.
+LOG_BATCH = 256         # entries written per flush at most
+LOG_FLUSH_INTERVAL = 1.0  # seconds before a partial batch is flushed
+INDEX_RECORD = struct.Struct("<qQ")
+
+def parse_since(text, now=None):
+    # "30m", "2h", "1d", an ISO date/time, or a unix timestamp -> unix seconds
+    now = time.time() if now is None else now
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if text[-1:] in units and text[:-1].isdigit():
+        return now - int(text[:-1]) * units[text[-1]]
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        pass
+    value = float(text)
+    if not math.isfinite(value):
+        raise ValueError(f"not a finite time: {text}")
+    return value
+
+class ChatLog:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.queue = queue.Queue()
+        self.files = {}  # channel -> (log file, index file)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def _paths(self, channel):
+        base = os.path.join(self.directory, quote(channel.lower(), safe=""))
+        return base + ".log", base + ".idx"
+
+    def append(self, channel, nick, kind, text=""):
+        # Called from the listen thread: never touches the disk
+        self.queue.put((channel.lower(), int(time.time() * 1000), nick, kind, text))
+
+    def flush(self, timeout=2.0):
+        # Waits (up to timeout) until everything appended so far is on disk
+        deadline = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.thread.is_alive():
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join(2.0)
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            batch = [item]
+            deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+            while item is not None and len(batch) < LOG_BATCH:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            entries = [e for e in batch if e is not None]
+            try:
+                self._write(entries)
+            except Exception as e:
+                log(f"Chat log error: {e}", RED)
+            for _ in batch:
+                self.queue.task_done()
+            if len(entries) != len(batch):
+                for log_file, index_file in self.files.values():
+                    log_file.close()
+                    index_file.close()
+                return
+
+    def _write(self, entries):
+        by_channel = {}
+        for channel, stamp, nick, kind, text in entries:
+            line = f"{stamp}\t{nick}\t{kind}\t{text}\n".encode("utf-8", errors="replace")
+            by_channel.setdefault(channel, []).append((stamp, line))
+
+        for channel, lines in by_channel.items():
+            if channel not in self.files:
+                log_path, index_path = self._paths(channel)
+                self.files[channel] = (open(log_path, "ab"), open(index_path, "ab"))
+            log_file, index_file = self.files[channel]
+            offset = log_file.tell()
+            log_file.write(b"".join(line for _, line in lines))
+            log_file.flush()
+            index_file.write(INDEX_RECORD.pack(lines[0][0], offset))
+            index_file.flush()
+
+    def _start_offset(self, index_path, since_ms):
+        # Binary search for the last batch starting at or before since_ms
+        try:
+            with open(index_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        lo, hi = 0, len(data) // INDEX_RECORD.size
+        offset = 0
+        while lo < hi:
+            mid = (lo + hi) // 2
+            stamp, pos = INDEX_RECORD.unpack_from(data, mid * INDEX_RECORD.size)
+            if stamp <= since_ms:
+                offset = pos
+                lo = mid + 1
+            else:
+                hi = mid
+        return offset
+
+    def replay(self, channel, since):
+        # Yields (unix seconds, nick, kind, text) for entries at or after `since`
+        if not self.flush():
+            log("Chat log is behind; the newest lines may be missing", RED)
+        log_path, index_path = self._paths(channel)
+        since_ms = int(since * 1000)
+        offset = self._start_offset(index_path, since_ms)
+        try:
+            f = open(log_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                mm.seek(offset)
+                for raw in iter(mm.readline, b""):
+                    try:
+                        stamp, nick, kind, text = raw.decode("utf-8", errors="replace").rstrip("\n").split("\t", 3)
+                        stamp = int(stamp)
+                    except ValueError:
+                        continue  # torn or corrupt line
+                    if stamp >= since_ms:
+                        yield stamp / 1000, nick, kind, text
+
 # --------- IRC CLIENT ----------
 class IRCClient:
-    def __init__(self, server, port, nick, channel):
+    def __init__(self, server, port, nick, channel, flood_burst=FLOOD_BURST, flood_interval=FLOOD_INTERVAL,
+                 log_dir=None):
         self.server = server
         self.port = port
         self.nick = nick
         self.channel = channel
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.outbox = SendQueue(self.sock.sendall, flood_burst, flood_interval)
+        self.chatlog = None
+        if log_dir:
+            try:
+                self.chatlog = ChatLog(log_dir)
+            except OSError as e:
+                # Logging is optional: carry on without it
+                log(f"Chat log disabled ({log_dir}): {e}", RED)
         self.connected = False
 
     def connect(self):
         log(f"Connecting to {self.server}:{self.port} as {self.nick}", YELLOW)
         self.sock.connect((self.server, self.port))
+        self.outbox.start()
 
         self.send_cmd(f"NICK {self.nick}")
         self.send_cmd(f"USER {self.nick} 0 * :{self.nick}")
@@ -42,8 +572,11 @@ class IRCClient:
         if self.channel:
             self.join(self.channel)
 
-    def send_cmd(self, cmd):
-        self.sock.sendall((cmd + "\r\n").encode())
+    def send_cmd(self, cmd, priority=None):
+        # Queued for the writer thread; safe to call from any thread
+        if priority is None:
+            priority = command_priority(cmd)
+        self.outbox.put(cmd, priority)
 
     def join(self, channel):
         self.channel = channel
@@ -55,73 +588,391 @@ class IRCClient:
             log("Not in a channel", RED)
             return
         self.send_cmd(f"PRIVMSG {self.channel} :{msg}")
+        if self.chatlog:
+            self.chatlog.append(self.channel, self.nick, "PRIVMSG", msg)
+
+    def history(self, channel, since):
+        if not self.chatlog:
+            log("Logging is disabled", RED)
+            return
+        count = 0
+        for stamp, nick, kind, text in self.chatlog.replay(channel, since):
+            when = datetime.fromtimestamp(stamp).strftime("%Y-%m-%d %H:%M:%S")
+            if kind == "PRIVMSG":
+                print(f"{GRAY}[{when}] <{nick}> {text}{RESET}")
+            elif kind == "JOIN":
+                print(f"{GRAY}[{when}] {nick} joined {channel}{RESET}")
+            count += 1
+        log(f"{count} lines from {channel}", YELLOW)
 
     def quit(self):
-        self.send_cmd("QUIT :bye")
+        # QUIT goes after anything already typed, then the backlog is flushed
+        self.send_cmd("QUIT :bye", PRIORITY_NORMAL)
+        self.outbox.close()
+        if self.chatlog:
+            self.chatlog.close()
         self.sock.close()
         self.connected = False
         log("Disconnected", RED)
         sys.exit(0)
 
     def listen(self):
-        buffer = ""
+        framer = LineFramer()
         while self.connected:
             try:
-                data = self.sock.recv(4096).decode(errors="ignore")
+                data = self.sock.recv(4096)
                 if not data:
                     break
 
-                buffer += data
-                while "\r\n" in buffer:
-                    line, buffer = buffer.split("\r\n", 1)
-                    self.handle_line(line)
+                for raw in framer.feed(data):
+                    self.handle_line(decode_line(raw))
             except Exception as e:
                 log(f"Error: {e}", RED)
                 break
 
     def handle_line(self, line):
-        if line.startswith("PING"):
-            self.send_cmd(f"PONG {line.split()[1]}")
+        msg = parse_message(line)
+        if msg is None:
             return
 
-        parts = line.split()
-        if len(parts) < 2:
+        if msg.command == "PING":
+            self.send_cmd(f"PONG :{msg.params[0] if msg.params else ''}")
             return
 
-        prefix = parts[0]
-        cmd = parts[1]
-
-        if cmd == "PRIVMSG":
-            nick = prefix.split("!")[0][1:]
-            channel = parts[2]
-            message = " ".join(parts[3:])[1:]
-            print(f"{BLUE}[{ts()}] <{nick}> {message}{RESET}")
+        if msg.command == "PRIVMSG" and len(msg.params) > 1:
+            print(f"{BLUE}[{ts()}] <{msg.nick}> {msg.params[1]}{RESET}")
+            if self.chatlog:
+                # Direct messages are addressed to us: file them under the sender
+                target = msg.params[0]
+                if target.lower() == self.nick.lower():
+                    target = msg.nick
+                self.chatlog.append(target, msg.nick, "PRIVMSG", msg.params[1])
 
-        elif cmd == "JOIN":
-            nick = prefix.split("!")[0][1:]
-            channel = parts[2] if len(parts) > 2 else self.channel
-            log(f"{nick} joined {channel}", GREEN)
+        elif msg.command == "JOIN":
+            channel = msg.params[0] if msg.params else self.channel
+            log(f"{msg.nick} joined {channel}", GREEN)
+            if self.chatlog and channel:
+                self.chatlog.append(channel, msg.nick, "JOIN")
 
         else:
             # ignore everything else safely
             pass
 
 
+# --------- ASYNC ENGINE ----------
+# One event loop drives any number of connections, each with any number
+# of channels. Handlers are plain callables (or coroutines) called as
+# handler(conn, msg) with an IRCMessage and can be registered per
+# connection or on the engine for every connection.
+
+class AsyncIRCConnection:
+    def __init__(self, name, server, port, nick, channels=(), use_ssl=False,
+                 flood_burst=FLOOD_BURST, flood_interval=FLOOD_INTERVAL):
+        self.name = name
+        self.server = server
+        self.port = port
+        self.nick = nick
+        self.use_ssl = use_ssl
+        self.autojoin = list(channels)
+        self.channels = set()
+        self.channel = self.autojoin[0] if self.autojoin else None  # default target for plain text
+        self.handlers = {}
+        self.handler_tasks = set()  # coroutine handlers still running
+        self.engine = None
+        self.writer = None
+        self.outbox = AsyncSendQueue(flood_burst, flood_interval, name)
+        self.connected = False
+        self.quitting = False
+        self.close_task = None
+
+    def on(self, command, handler):
+        self.handlers.setdefault(command.upper(), []).append(handler)
+        return handler
+
+    def send_cmd(self, cmd, priority=None):
+        if priority is None:
+            priority = command_priority(cmd)
+        self.outbox.put(cmd, priority)
+
+    def join(self, channel):
+        self.channel = channel
+        self.send_cmd(f"JOIN {channel}")
+
+    def part(self, channel):
+        self.send_cmd(f"PART {channel}")
+
+    def send_message(self, target, msg):
+        self.send_cmd(f"PRIVMSG {target} :{msg}")
+
+    def quit(self, msg="bye"):
+        # Safe at any point: before or during connect, run() sees the flag
+        if self.quitting:
+            return
+        self.quitting = True
+        if self.connected:
+            self.send_cmd(f"QUIT :{msg}", PRIORITY_NORMAL)  # after anything already queued
+            self.close_task = asyncio.ensure_future(self._close())
+
+    async def _close(self):
+        await self.outbox.close()
+        self.writer.close()
+
+    async def run(self):
+        if self.quitting:
+            return
+        log(f"[{self.name}] Connecting to {self.server}:{self.port} as {self.nick}", YELLOW)
+        context = ssl.create_default_context() if self.use_ssl else None
+        reader, self.writer = await asyncio.open_connection(self.server, self.port, ssl=context)
+        if self.quitting:
+            # quit() arrived while we were connecting
+            self.writer.close()
+            return
+        self.connected = True
+        self.outbox.start(self.writer)
+
+        self.send_cmd(f"NICK {self.nick}")
+        self.send_cmd(f"USER {self.nick} 0 * :{self.nick}")
+
+        framer = LineFramer()
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                for raw in framer.feed(data):
+                    self.handle_line(decode_line(raw))
+        finally:
+            self.connected = False
+            self.channels.clear()
+            self.outbox.cancel()
+            self.writer.close()
+            self.dispatch(IRCMessage({}, "", "DISCONNECT", []))
+
+    def handle_line(self, line):
+        msg = parse_message(line)
+        if msg is None:
+            return
+        command, params = msg.command, msg.params
+
+        # Protocol housekeeping before user handlers see the event
+        if command == "PING":
+            self.send_cmd(f"PONG :{params[0] if params else ''}")
+        elif command == "001":
+            for channel in self.autojoin:
+                self.send_cmd(f"JOIN {channel}")
+        elif command == "433":
+            # Nick in use: retry with a suffix
+            self.nick += "_"
+            self.send_cmd(f"NICK {self.nick}")
+        elif command == "JOIN" and msg.nick == self.nick and params:
+            self.channels.add(params[0])
+        elif command == "PART" and msg.nick == self.nick and params:
+            self.channels.discard(params[0])
+        elif command == "KICK" and len(params) > 1 and params[1] == self.nick:
+            self.channels.discard(params[0])
+
+        self.dispatch(msg)
+
+    def dispatch(self, msg):
+        command = msg.command
+        handlers = self.handlers.get(command, [])
+        if self.engine is not None:
+            handlers = self.engine.handlers.get(command, []) + handlers
+        for handler in handlers:
+            try:
+                result = handler(self, msg)
+                if asyncio.iscoroutine(result):
+                    task = asyncio.ensure_future(result)
+                    self.handler_tasks.add(task)
+                    task.add_done_callback(lambda t, command=command: self._handler_done(t, command))
+            except Exception as e:
+                log(f"[{self.name}] Handler error on {command}: {e}", RED)
+
+    def _handler_done(self, task, command):
+        self.handler_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log(f"[{self.name}] Handler error on {command}: {task.exception()}", RED)
+
+class IRCEngine:
+    def __init__(self):
+        self.connections = {}
+        self.handlers = {}
+        self.tasks = {}
+        self.idle = None
+
+    def on(self, command, handler):
+        self.handlers.setdefault(command.upper(), []).append(handler)
+        return handler
+
+    def add_connection(self, name, server, port, nick, channels=(), use_ssl=False,
+                       flood_burst=FLOOD_BURST, flood_interval=FLOOD_INTERVAL):
+        if name in self.connections:
+            raise ValueError(f"Duplicate connection name: {name}")
+        conn = AsyncIRCConnection(name, server, port, nick, channels, use_ssl, flood_burst, flood_interval)
+        conn.engine = self
+        self.connections[name] = conn
+        if self.idle is not None:
+            self.start(conn)  # engine already running
+        return conn
+
+    def start(self, conn):
+        self.idle.clear()
+        task = asyncio.ensure_future(self._run_connection(conn))
+        self.tasks[conn.name] = task
+        task.add_done_callback(lambda t: self._finished(conn.name))
+
+    def _finished(self, name):
+        self.tasks.pop(name, None)
+        if not self.tasks:
+            self.idle.set()
+
+    async def _run_connection(self, conn):
+        try:
+            await conn.run()
+        except OSError as e:
+            log(f"[{conn.name}] Connection error: {e}", RED)
+        log(f"[{conn.name}] Disconnected", RED)
+
+    async def run(self):
+        # Returns once every connection has closed
+        self.idle = asyncio.Event()
+        self.idle.set()
+        for conn in self.connections.values():
+            self.start(conn)
+        await self.idle.wait()
+
+    def quit(self, msg="bye"):
+        for conn in self.connections.values():
+            conn.quit(msg)
+
+def load_config(path):
+    # JSON list of {"name", "server", "port", "nick", "channels", "ssl"}
+    # plus optional "flood_burst" / "flood_interval"
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def start_stdin_reader(loop, lines):
+    # stdin is read on a daemon thread so it never blocks the loop or
+    # keeps the process alive at exit; "" marks EOF
+    def pump():
+        try:
+            for line in iter(sys.stdin.readline, ""):
+                loop.call_soon_threadsafe(lines.put_nowait, line)
+            loop.call_soon_threadsafe(lines.put_nowait, "")
+        except RuntimeError:
+            pass  # loop already closed
+
+    threading.Thread(target=pump, daemon=True).start()
+
+async def run_engine_cli(config):
+    engine = IRCEngine()
+    for entry in config:
+        engine.add_connection(
+            name=entry.get("name", entry["server"]),
+            server=entry["server"],
+            port=entry.get("port", 6667),
+            nick=entry["nick"],
+            channels=entry.get("channels", []),
+            use_ssl=entry.get("ssl", False),
+            flood_burst=entry.get("flood_burst", FLOOD_BURST),
+            flood_interval=entry.get("flood_interval", FLOOD_INTERVAL),
+        )
+
+    def on_privmsg(conn, msg):
+        if len(msg.params) > 1:
+            print(f"{BLUE}[{ts()}] [{conn.name}] {msg.params[0]} <{msg.nick}> {msg.params[1]}{RESET}")
+
+    def on_join(conn, msg):
+        if msg.params:
+            log(f"[{conn.name}] {msg.nick} joined {msg.params[0]}", GREEN)
+
+    engine.on("PRIVMSG", on_privmsg)
+    engine.on("JOIN", on_join)
+
+    current = next(iter(engine.connections.values()))
+    engine_task = asyncio.ensure_future(engine.run())
+    lines = asyncio.Queue()
+    start_stdin_reader(asyncio.get_running_loop(), lines)
+
+    while True:
+        # Wake on input, or stop as soon as every connection has closed
+        get = asyncio.ensure_future(lines.get())
+        done, _ = await asyncio.wait({get, engine_task}, return_when=asyncio.FIRST_COMPLETED)
+        if get not in done:
+            get.cancel()
+            break
+        user_input = get.result()
+        if not user_input:
+            engine.quit()
+            break
+        user_input = user_input.rstrip("\n")
+        if user_input.startswith("/server"):
+            parts = user_input.split(maxsplit=1)
+            if len(parts) == 2 and parts[1] in engine.connections:
+                current = engine.connections[parts[1]]
+                log(f"Now talking on {current.name}", YELLOW)
+            else:
+                log(f"Connections: {', '.join(engine.connections)}", YELLOW)
+        elif user_input.startswith("/join"):
+            parts = user_input.split(maxsplit=1)
+            if len(parts) != 2:
+                log("Usage: /join <channel>", RED)
+                continue
+            current.join(parts[1])
+        elif user_input.startswith("/part"):
+            parts = user_input.split(maxsplit=1)
+            if len(parts) != 2:
+                log("Usage: /part <channel>", RED)
+                continue
+            current.part(parts[1])
+        elif user_input.startswith("/msg"):
+            parts = user_input.split(maxsplit=2)
+            if len(parts) != 3:
+                log("Usage: /msg <target> <text>", RED)
+                continue
+            current.send_message(parts[1], parts[2])
+        elif user_input.startswith("/quit"):
+            engine.quit()
+            break
+        elif current.channel:
+            current.send_message(current.channel, user_input)
+        else:
+            log("Not in a channel", RED)
+
+    await engine_task
+
 # --------- CLI ----------
 def main():
     parser = argparse.ArgumentParser(description="Minimal IRC Client (raw sockets)")
     parser.add_argument("--server", default="irc.libera.chat")
     parser.add_argument("--port", type=int, default=6667)
-    parser.add_argument("--nick", required=True)
+    parser.add_argument("--nick")
     parser.add_argument("--channel", default=None)
+    parser.add_argument("--config", help="JSON list of servers to run together on the asyncio engine")
+    parser.add_argument("--flood-burst", type=int, default=FLOOD_BURST, help="lines sent before pacing starts")
+    parser.add_argument("--flood-interval", type=float, default=FLOOD_INTERVAL, help="seconds per line once paced")
+    parser.add_argument("--log-dir", default="irc-logs", help="chat log directory (empty string disables logging)")
 
     args = parser.parse_args()
 
+    if args.config:
+        try:
+            asyncio.run(run_engine_cli(load_config(args.config)))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if not args.nick:
+        parser.error("--nick is required unless --config is given")
+
     client = IRCClient(
         server=args.server,
         port=args.port,
         nick=args.nick,
         channel=args.channel,
+        flood_burst=args.flood_burst,
+        flood_interval=args.flood_interval,
+        log_dir=args.log_dir,
     )
 
     client.connect()
@@ -134,6 +985,20 @@ def main():
                 client.join(ch)
             elif user_input.startswith("/quit"):
                 client.quit()
+            elif user_input.startswith("/history"):
+                parts = user_input.split()
+                if len(parts) != 3:
+                    log("Usage: /history <channel> <since> (e.g. 30m, 2h, 2024-01-01T12:00)", RED)
+                    continue
+                try:
+                    since = parse_since(parts[2])
+                except ValueError:
+                    log(f"Bad time: {parts[2]}", RED)
+                    continue
+                client.history(parts[1], since)
+            elif user_input.startswith("/stats"):
+                stats = client.outbox.stats()
+                log(", ".join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in stats.items()), YELLOW)
             else:
                 client.send_message(user_input)
         except KeyboardInterrupt: